@@ -15,9 +15,16 @@ It is written in Python 3.8 and tested under Linux.
 
 import os
 import sys
+import glob
+import hashlib
 import logging
+import tempfile
+import contextlib
+import functools
+import concurrent.futures
+import numpy as np
 import pandas as pd
-from datetime import timedelta
+import pyarrow
 
 logging.basicConfig(
     format="%(asctime)s %(levelname)s %(message)s",
@@ -25,9 +32,24 @@ logging.basicConfig(
     stream=sys.stdout,
 )
 
+# Columns of the Fahrten data holding timestamps
+_DT_COLS = ["anfang", "ende", "fahrt_anfang", "fahrt_ende"]
+
+# Columns loaded by default, i.e. those needed to verify and merge the data
+_NEEDED_COLS = _DT_COLS + ["fahrtneu_id"]
+
+# Known column types of the Fahrten data, passed to read_csv so that these
+# columns skip type inference. The nullable "Int64" keeps exports with
+# occasional missing ids loadable.
+_DTYPES = {"fahrtneu_id": "Int64"}
+
+# Version of the cached dataframes; bump it whenever the output of
+# '_read_one' changes, so that caches of older versions are not served
+_CACHE_VERSION = 1
+
 
 def combine_and_verify_booking_data(
-    csv_files, encoding="ISO-8859-1", delimiter=";"
+    csv_files, encoding="ISO-8859-1", delimiter=";", columns=None, cache=True
 ):
     """
     This function combines booking data from a list of CSV files, sorts the
@@ -47,6 +69,11 @@ def combine_and_verify_booking_data(
     csv_files (list): A list of CSV files containing booking data.
     encoding (str): Encoding type of the CSV files. Defaults to "ISO-8859-1".
     delimiter (str): Delimiter used in the CSV files. Defaults to ";".
+    columns (list): Columns to load from the CSV files. Has to include
+        'anfang' and 'fahrtneu_id'. Defaults to the four date columns and
+        'fahrtneu_id'.
+    cache (bool): Whether to cache the parsed CSV files on disk. Defaults
+        to True.
 
     Returns:
     df_list_sorted (list): A list of sorted dataframes containing booking data.
@@ -54,14 +81,19 @@ def combine_and_verify_booking_data(
     """
     # Load and sort Fahrten data
     df_list_sorted, csv_files_sorted = load_and_sort_fahrten_data(
-        csv_files, encoding, delimiter
+        csv_files, encoding, delimiter, columns, cache
     )
 
+    # First and last booking of each file, shared by both checks
+    bounds = _anfang_bounds(df_list_sorted)
+
     # Verify overlapping bookings
-    verify_overlapping_bookings(df_list_sorted)
+    verify_overlapping_bookings(df_list_sorted, bounds)
 
     # Assert time difference in bookings
-    assert_time_difference_in_bookings(df_list_sorted, csv_files_sorted)
+    assert_time_difference_in_bookings(
+        df_list_sorted, csv_files_sorted, bounds=bounds
+    )
 
     return merge_nonoverlapping_dfs(df_list_sorted)
 
@@ -103,66 +135,149 @@ def merge_nonoverlapping_dfs(df_list_sorted):
             "'df_list_sorted' should be a list of pandas DataFrame objects"
         )
 
-    master_df = df_list_sorted[0]
+    # Collect the non-overlapping parts and concatenate them once at the end;
+    # concatenating inside the loop would copy the growing result every time
+    parts = [df_list_sorted[0]]
+    last_date_master_df = parts[0]["anfang"].max().to_datetime64()
 
     for i in range(1, len(df_list_sorted)):
-        last_date_master_df = master_df["anfang"].max()
-
         # Include only those records in the current DataFrame that have a timestamp greater
-        # than the maximum timestamp in the previous (master) DataFrame
-        new_data = df_list_sorted[i][
-            df_list_sorted[i]["anfang"] > last_date_master_df
-        ]
-
-        master_df = pd.concat([master_df, new_data])
+        # than the maximum timestamp in the previous (master) DataFrame.
+        # Records without timestamp are sorted last and left out.
+        anfang = df_list_sorted[i]["anfang"].to_numpy()
+        start = _searchsorted(anfang, last_date_master_df, side="right")
+        new_data = df_list_sorted[i].iloc[start : _count_valid(anfang)]
+
+        if len(new_data):
+            parts.append(new_data)
+            # Every record in 'new_data' is later than the master, so its
+            # maximum is the new maximum of the master
+            last_date_master_df = new_data["anfang"].max().to_datetime64()
+
+    # Concatenating the numpy arrays column by column and wrapping them
+    # without another copy bypasses the bookkeeping of pd.concat. This
+    # requires identical numpy dtypes; frames with differing or extension
+    # dtypes (e.g. strings) use pd.concat.
+    dtypes = parts[0].dtypes
+    if all(isinstance(dtype, np.dtype) for dtype in dtypes) and all(
+        part.dtypes.equals(dtypes) for part in parts
+    ):
+        return pd.DataFrame(
+            {
+                col: np.concatenate([part[col].to_numpy() for part in parts])
+                for col in parts[0].columns
+            },
+            copy=False,
+        )
 
-    return master_df
+    return pd.concat(parts, ignore_index=True)
 
 
-def verify_overlapping_bookings(df_list_sorted):
+def verify_overlapping_bookings(df_list_sorted, bounds=None):
     """
     This function verifies whether there are any overlapping bookings
     within the list of sorted dataframes.
 
     Parameters:
-    df_list_sorted (list): A list of sorted dataframes.
+    df_list_sorted (list): A list of dataframes, each sorted by 'anfang'.
+    bounds (numpy.ndarray): Array of shape (len(df_list_sorted), 2) holding
+        the first and last 'anfang' of each dataframe. Computed if None.
 
     Returns:
     None
     """
-    for i in range(len(df_list_sorted) - 1):
-        last_date_current_df = df_list_sorted[i]["anfang"].max()
-        first_date_next_df = df_list_sorted[i + 1]["anfang"].min()
-
-        if last_date_current_df >= first_date_next_df:
-            overlap_current_df = df_list_sorted[i][
-                df_list_sorted[i]["anfang"] >= first_date_next_df
-            ]
-            overlap_next_df = df_list_sorted[i + 1][
-                df_list_sorted[i + 1]["anfang"] <= last_date_current_df
-            ]
-
-            # Check if overlapping dataframes have the same length
-            assert_msg_len = f"The overlapping bookings have different lengths between files {i} and {i+1}"
-            assert len(overlap_current_df) == len(
-                overlap_next_df
-            ), assert_msg_len
-
-            # Reset index for comparison
-            overlap_current_id = overlap_current_df.reset_index()[
-                "fahrtneu_id"
-            ]
-            overlap_next_id = overlap_next_df.reset_index()["fahrtneu_id"]
-
-            # Check if 'fahrtneu_id' values are the same in both dataframes
-            assert_msg_id = f"The overlapping bookings do not align between files {i} and {i+1}"
-            assert set(overlap_current_id) == set(
-                overlap_next_id
-            ), assert_msg_id
+    if bounds is None:
+        bounds = _anfang_bounds(df_list_sorted)
+
+    # Find all overlapping pairs of consecutive files at once
+    for i in np.flatnonzero(_overlapping_pairs(bounds)):
+        last_date_current_df = bounds[i, 1]
+        first_date_next_df = bounds[i + 1, 0]
+
+        overlap_current_id, overlap_next_id = _overlapping_ids(
+            df_list_sorted[i],
+            df_list_sorted[i + 1],
+            first_date_next_df,
+            last_date_current_df,
+        )
+
+        # Check if overlapping bookings have the same length
+        assert_msg_len = f"The overlapping bookings have different lengths between files {i} and {i+1}"
+        assert len(overlap_current_id) == len(
+            overlap_next_id
+        ), assert_msg_len
+
+        # Check if 'fahrtneu_id' values are the same in both dataframes.
+        # Consecutive exports usually list them in the same order, so
+        # only sort them if a direct comparison fails. Missing ids are NaN
+        # and compare equal.
+        assert_msg_id = f"The overlapping bookings do not align between files {i} and {i+1}"
+        assert np.array_equal(
+            overlap_current_id, overlap_next_id, equal_nan=True
+        ) or np.array_equal(
+            np.sort(overlap_current_id),
+            np.sort(overlap_next_id),
+            equal_nan=True,
+        ), assert_msg_id
+
+
+def _overlapping_ids(
+    df_current, df_next, first_date_next_df, last_date_current_df
+):
+    """
+    Return the 'fahrtneu_id' values of the overlapping bookings of two
+    consecutive dataframes.
+
+    Both dataframes are sorted by 'anfang', so the overlaps are a tail of
+    'df_current' and a head of 'df_next'. The tail ends before the bookings
+    without 'anfang', which are sorted last. The boundaries are found by
+    binary search on the underlying numpy arrays, and only the overlapping
+    ids are converted to numpy. Missing ids become NaN.
+    """
+    anfang_current = df_current["anfang"].to_numpy()
+    start = _searchsorted(anfang_current, first_date_next_df, side="left")
+    stop = _searchsorted(
+        df_next["anfang"].to_numpy(), last_date_current_df, side="right"
+    )
+    return (
+        df_current["fahrtneu_id"]
+        .iloc[start : _count_valid(anfang_current)]
+        .to_numpy(),
+        df_next["fahrtneu_id"].iloc[:stop].to_numpy(),
+    )
+
+
+def _searchsorted(values, value, side):
+    """
+    Find the index at which the datetime64 scalar 'value' would be inserted
+    into the sorted datetime64 array 'values'.
+
+    'value' is cast to the unit of 'values' first, as numpy would otherwise
+    cast the whole array to the unit of 'value' before searching. If the
+    cast truncates 'value', it lies strictly between two representable
+    times, and both sides are answered by searching right of the truncated
+    value.
+    """
+    cast_value = np.datetime64(value, np.datetime_data(values.dtype)[0])
+    if cast_value != value:
+        side = "right"
+    return np.searchsorted(values, cast_value, side=side)
+
+
+def _count_valid(values):
+    """
+    Return the number of non-NaT entries of the sorted datetime64 array
+    'values', i.e. the index of its first NaT.
+    """
+    return np.searchsorted(
+        values,
+        np.datetime64("NaT", np.datetime_data(values.dtype)[0]),
+        side="left",
+    )
 
 
 def assert_time_difference_in_bookings(
-    df_list_sorted, csv_files_sorted, threshold_hours=6
+    df_list_sorted, csv_files_sorted, threshold_hours=6, bounds=None
 ):
     """
     This function asserts that the time difference between bookings in
@@ -172,57 +287,253 @@ def assert_time_difference_in_bookings(
     df_list_sorted (list): A list of sorted dataframes.
     csv_files_sorted (list): A list of sorted CSV files.
     threshold_hours (int): Maximum allowed time difference in hours.
+    bounds (numpy.ndarray): Array of shape (len(df_list_sorted), 2) holding
+        the first and last 'anfang' of each dataframe. Computed if None.
 
     Returns:
     None
     """
-    for i in range(len(df_list_sorted) - 1):
-        last_date_current_df = pd.to_datetime(
-            df_list_sorted[i]["anfang"].max()
+    if bounds is None:
+        bounds = _anfang_bounds(df_list_sorted)
+
+    # Find all non-overlapping pairs of consecutive files at once
+    for i in np.flatnonzero(~_overlapping_pairs(bounds)):
+        last_date_current_df = bounds[i, 1]
+        first_date_next_df = bounds[i + 1, 0]
+
+        time_diff = first_date_next_df - last_date_current_df
+        assert_msg = (
+            f"No overlap and time difference greater than {threshold_hours} "
+            f"hours between {csv_files_sorted[i]} and {csv_files_sorted[i+1]}"
         )
-        first_date_next_df = pd.to_datetime(
-            df_list_sorted[i + 1]["anfang"].min()
+        assert time_diff <= pd.Timedelta(hours=threshold_hours), assert_msg
+        logging.warning(
+            f"No overlap between {csv_files_sorted[i]} and {csv_files_sorted[i+1]}.\n"
+            f"Last date: {pd.Timestamp(last_date_current_df)}\n"
+            f"First date: {pd.Timestamp(first_date_next_df)}"
         )
 
-        if not last_date_current_df >= first_date_next_df:
-            time_diff = first_date_next_df - last_date_current_df
-            assert_msg = (
-                f"No overlap and time difference greater than {threshold_hours} "
-                f"hours between {csv_files_sorted[i]} and {csv_files_sorted[i+1]}"
-            )
-            assert time_diff <= timedelta(hours=threshold_hours), assert_msg
-            logging.warning(
-                f"No overlap between {csv_files_sorted[i]} and {csv_files_sorted[i+1]}.\n"
-                f"Last date: {last_date_current_df}\n"
-                f"First date: {first_date_next_df}"
-            )
+
+def _anfang_bounds(df_list_sorted):
+    """
+    Return an array of shape (len(df_list_sorted), 2) with the first and
+    last 'anfang' of each dataframe.
+
+    The array uses the finest unit of the 'anfang' columns, so no bound is
+    rounded and none is finer than necessary.
+    """
+    dtype = (
+        np.result_type(*(df["anfang"].dtype for df in df_list_sorted))
+        if df_list_sorted
+        else "datetime64[ns]"
+    )
+    return np.array(
+        [(df["anfang"].min(), df["anfang"].max()) for df in df_list_sorted],
+        dtype=dtype,
+    ).reshape(-1, 2)
+
+
+def _overlapping_pairs(bounds):
+    """
+    Return a boolean array that is True at index i if the bookings of
+    dataframe i and dataframe i + 1 overlap.
+    """
+    return bounds[:-1, 1] >= bounds[1:, 0]
 
 
 def load_and_sort_fahrten_data(
-    csv_files, encoding="ISO-8859-1", delimiter=";"
+    csv_files, encoding="ISO-8859-1", delimiter=";", columns=None, cache=True
 ):
     """
-    This function reads the Fahrten data from a list of CSV files and sorts
-    the dataframes by 'fahrt_anfang'.
+    This function reads the Fahrten data from a list of CSV files, sorts
+    the files by name and the rows of each dataframe by 'anfang'.
 
     Parameters:
     csv_files (list): A list of CSV files.
     encoding (str): Encoding type of the CSV files.
     delimiter (str): Delimiter used in the CSV files.
+    columns (list): Columns to load. Has to include 'anfang'. Defaults to
+        the four date columns and 'fahrtneu_id'.
+    cache (bool): Whether to store the parsed dataframes next to the CSV
+        files and reuse them as long as the CSV files are unchanged.
 
     Returns:
     df_list_sorted (list): A list of sorted dataframes.
     csv_files_sorted (list): A list of sorted CSV files.
     """
+    if columns is None:
+        columns = _NEEDED_COLS
+
     csv_files_sorted = sorted(csv_files)
+
+    # Serve cache hits in this process, so that only the files that need
+    # parsing are sent to worker processes
     df_list_sorted = [
-        pd.read_csv(f, encoding=encoding, delimiter=delimiter)
+        _read_cache(_cache_file(f, encoding, delimiter, columns))
+        if cache
+        else None
         for f in csv_files_sorted
     ]
-    for df in df_list_sorted:
-        df["anfang"] = pd.to_datetime(df["anfang"])
-        df["ende"] = pd.to_datetime(df["ende"])
-        df["fahrt_anfang"] = pd.to_datetime(df["fahrt_anfang"])
-        df["fahrt_ende"] = pd.to_datetime(df["fahrt_ende"])
+    misses = [
+        f for f, df in zip(csv_files_sorted, df_list_sorted) if df is None
+    ]
+
+    read = functools.partial(
+        _read_and_cache if cache else _read_one,
+        encoding=encoding,
+        delimiter=delimiter,
+        columns=columns,
+    )
+
+    # Without a second worker, a process pool only adds startup and pickling
+    # overhead; parse in this process with Arrow's multithreaded reader
+    max_workers = min(len(misses), os.cpu_count() or 1)
+    if max_workers <= 1:
+        parsed = [read(f) for f in misses]
+    else:
+        # Files are independent, so parse them in parallel worker
+        # processes, each restricted to one Arrow thread. 'map' keeps the
+        # results in the order of 'misses'.
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=max_workers, initializer=_init_worker
+        ) as executor:
+            parsed = list(executor.map(read, misses))
+
+    parsed = iter(parsed)
+    df_list_sorted = [
+        next(parsed) if df is None else df for df in df_list_sorted
+    ]
+
+    return df_list_sorted, csv_files_sorted
+
+
+def _init_worker():
+    """
+    Limit Arrow to a single thread in a worker process of
+    'load_and_sort_fahrten_data', as the files are already parsed in
+    parallel across the workers.
+    """
+    pyarrow.set_cpu_count(1)
+
+
+def _cache_file(path, encoding, delimiter, columns):
+    """
+    Return the name of the cache file of the CSV file 'path'.
+
+    The cache is a feather file next to the CSV file. Its name is keyed by
+    the size and modification time of the CSV file, the read arguments and
+    the cache version, so a changed file, changed arguments or an upgrade
+    cause a fresh parse.
+    """
+    stat = os.stat(path)
+    key = hashlib.md5(
+        repr(
+            (
+                _CACHE_VERSION,
+                stat.st_size,
+                stat.st_mtime_ns,
+                encoding,
+                delimiter,
+                columns,
+            )
+        ).encode()
+    ).hexdigest()
+    return f"{path}.{key}.feather"
 
-    return df_list_sorted, csv_files
+
+def _read_cache(cache_file):
+    """
+    Return the dataframe cached in 'cache_file', or None if there is no
+    readable cache file.
+    """
+    if not os.path.isfile(cache_file):
+        return None
+    try:
+        return pd.read_feather(cache_file)
+    except (OSError, pyarrow.ArrowException) as e:
+        logging.warning(f"Ignoring unreadable cache {cache_file}: {e}")
+        return None
+
+
+def _read_and_cache(path, encoding, delimiter, columns):
+    """
+    Like '_read_one', but also store the parsed dataframe in the cache file
+    of 'path'. Outdated cache files of the same CSV file are removed.
+    """
+    cache_file = _cache_file(path, encoding, delimiter, columns)
+    df = _read_one(path, encoding, delimiter, columns)
+
+    # Write to a temporary file and move it into place, so that neither an
+    # interrupted write nor a concurrent reader sees a partial cache file
+    tmp_file = None
+    try:
+        fd, tmp_file = tempfile.mkstemp(
+            dir=os.path.dirname(cache_file) or ".",
+            prefix=os.path.basename(cache_file) + ".",
+            suffix=".tmp",
+        )
+        os.close(fd)
+        df.to_feather(tmp_file)
+        os.replace(tmp_file, cache_file)
+        tmp_file = None
+
+        # Match only the key pattern, not the caches of other files whose
+        # names start with the name of this file
+        stale_pattern = glob.escape(path) + "." + "[0-9a-f]" * 32 + ".feather"
+        for stale_file in glob.glob(stale_pattern):
+            if stale_file != cache_file:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(stale_file)
+    except (OSError, pyarrow.ArrowException) as e:
+        logging.warning(f"Could not cache {path}: {e}")
+    finally:
+        if tmp_file is not None:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_file)
+
+    return df
+
+
+def _read_one(path, encoding, delimiter, columns):
+    """
+    Read the given columns of a single Fahrten CSV file and convert its date
+    columns to datetime.
+
+    This is a module-level function so that it can be pickled and dispatched
+    to worker processes by 'load_and_sort_fahrten_data'.
+    """
+    # The pyarrow engine rejects read_csv's memory_map option, so map the
+    # file with Arrow itself and let the reader parse straight from the map
+    with pyarrow.memory_map(os.fspath(path)) as source:
+        df = pd.read_csv(
+            source,
+            encoding=encoding,
+            delimiter=delimiter,
+            engine="pyarrow",
+            usecols=columns,
+            dtype=_DTYPES,
+        )
+    # Arrow already parses ISO formatted timestamps while reading; convert
+    # the remaining date columns in a single assignment
+    dt_cols = [
+        col
+        for col in _DT_COLS
+        if col in df and not pd.api.types.is_datetime64_any_dtype(df[col])
+    ]
+    if dt_cols:
+        df[dt_cols] = df[dt_cols].apply(_fast_to_datetime)
+    # A stable sort keeps bookings with equal "anfang" in CSV row order
+    return df.sort_values("anfang", kind="stable", ignore_index=True)
+
+
+def _fast_to_datetime(series):
+    """
+    Convert a series of timestamp strings to datetime, parsing every
+    distinct value only once.
+
+    Booking exports repeat the same timestamps many times, so mapping the
+    parsed unique values back onto the series is much cheaper than parsing
+    each cell.
+    """
+    unique = series.unique()
+    return series.map(pd.Series(pd.to_datetime(unique), index=unique))
@@ -13,6 +13,7 @@ It is written in Python 3.8 and tested under Linux.
 
 import os
 import glob
+import pathlib
 import pandas as pd
 import pytest
 from halkit import csv_handler
@@ -26,11 +27,6 @@ def test_load_and_sort_fahrten_data():
         csv_files
     )
 
-    import ipdb  # NOQA
-
-    ipdb.set_trace()
-    pass
-
     # Check if dataframes are sorted correctly
     for i in range(len(df_list_sorted) - 1):
         assert (
@@ -68,6 +64,388 @@ def test_assert_time_difference_in_bookings():
     )
 
 
+def _bookings(ids, days):
+    return pd.DataFrame(
+        {
+            "fahrtneu_id": ids,
+            "anfang": pd.to_datetime([f"2023-01-{day:02d}" for day in days]),
+        }
+    )
+
+
+def test_verify_overlapping_bookings_same_order():
+    df_list_sorted = [
+        _bookings([1, 2, 3], [1, 2, 3]),
+        _bookings([2, 3, 4], [2, 3, 4]),
+        _bookings([5], [5]),
+    ]
+
+    # Ensure no AssertionError is raised
+    csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def test_verify_overlapping_bookings_different_order():
+    df_list_sorted = [
+        _bookings([1, 2, 3], [1, 2, 2]),
+        _bookings([3, 2, 4], [2, 2, 4]),
+    ]
+
+    # Ensure no AssertionError is raised
+    csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def test_verify_overlapping_bookings_length_mismatch():
+    df_list_sorted = [
+        _bookings([1, 2, 3], [1, 2, 3]),
+        _bookings([4], [4]),
+        _bookings([4, 5, 6], [4, 4, 6]),
+    ]
+
+    with pytest.raises(AssertionError, match="different lengths"):
+        csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def test_verify_overlapping_bookings_id_mismatch():
+    df_list_sorted = [
+        _bookings([1, 2, 3], [1, 2, 3]),
+        _bookings([2, 9, 4], [2, 3, 4]),
+    ]
+
+    with pytest.raises(AssertionError, match="do not align"):
+        csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def test_assert_time_difference_in_bookings_within_threshold():
+    df_list_sorted = [
+        _bookings([1, 2], [1, 2]),
+        _bookings([3, 4], [3, 4]),
+    ]
+
+    # Ensure no AssertionError is raised for a gap of one day
+    csv_handler.assert_time_difference_in_bookings(
+        df_list_sorted, ["a.csv", "b.csv"], threshold_hours=24
+    )
+
+
+def test_assert_time_difference_in_bookings_over_threshold():
+    df_list_sorted = [
+        _bookings([1, 2], [1, 2]),
+        _bookings([2, 3], [2, 3]),
+        _bookings([4, 5], [4, 5]),
+    ]
+
+    with pytest.raises(AssertionError, match="b.csv and c.csv"):
+        csv_handler.assert_time_difference_in_bookings(
+            df_list_sorted, ["a.csv", "b.csv", "c.csv"]
+        )
+
+
+def test_merge_nonoverlapping_dfs():
+    df_list_sorted = [
+        pd.DataFrame(
+            {
+                "fahrtneu_id": ids,
+                "anfang": pd.to_datetime(
+                    [f"2023-01-{day:02d}" for day in ids]
+                ),
+            }
+        )
+        for ids in ([1, 2, 3], [3, 4, 5], [6, 7])
+    ]
+
+    merged_df = csv_handler.merge_nonoverlapping_dfs(df_list_sorted)
+
+    assert merged_df["fahrtneu_id"].tolist() == [1, 2, 3, 4, 5, 6, 7]
+    assert merged_df.index.tolist() == list(range(7))
+
+
+def test_merge_nonoverlapping_dfs_mixed_dtypes():
+    # String columns and differing datetime units take the pd.concat path
+    df_list_sorted = [
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [1, 2],
+                "anfang": pd.to_datetime(["2023-01-01", "2023-01-02"]).astype(
+                    "datetime64[s]"
+                ),
+                "ort": ["Erlangen", "Erlangen"],
+            }
+        ),
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [2, 3],
+                "anfang": pd.to_datetime(["2023-01-02", "2023-01-03"]).astype(
+                    "datetime64[us]"
+                ),
+                "ort": ["Erlangen", "Nürnberg"],
+            }
+        ),
+    ]
+
+    merged_df = csv_handler.merge_nonoverlapping_dfs(df_list_sorted)
+
+    assert merged_df["fahrtneu_id"].tolist() == [1, 2, 3]
+    assert merged_df["ort"].tolist() == ["Erlangen", "Erlangen", "Nürnberg"]
+    assert merged_df.index.tolist() == list(range(3))
+
+
+def test_merge_nonoverlapping_dfs_missing_anfang():
+    df_list_sorted = [
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [1, 2, 3],
+                "anfang": pd.to_datetime(
+                    ["2023-01-01", "2023-01-02", "2023-01-03"]
+                ),
+            }
+        ),
+        # Rows without 'anfang' are sorted to the end
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [3, 4, 5],
+                "anfang": pd.to_datetime(["2023-01-03", "2023-01-04", None]),
+            }
+        ),
+    ]
+
+    merged_df = csv_handler.merge_nonoverlapping_dfs(df_list_sorted)
+
+    assert merged_df["fahrtneu_id"].tolist() == [1, 2, 3, 4]
+
+
+def test_verify_overlapping_bookings_missing_anfang():
+    df_list_sorted = [
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [1, 2, 3, 9],
+                "anfang": pd.to_datetime(
+                    ["2023-01-01", "2023-01-02", "2023-01-03", None]
+                ),
+            }
+        ),
+        pd.DataFrame(
+            {
+                "fahrtneu_id": [3, 4],
+                "anfang": pd.to_datetime(["2023-01-03", "2023-01-04"]),
+            }
+        ),
+    ]
+
+    # Ensure no AssertionError is raised
+    csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def _write_fahrten_csv(csv_file, ids, anfang):
+    lines = ["fahrtneu_id;anfang;ende;fahrt_anfang;fahrt_ende"]
+    lines += [f"{i};{a};{a};{a};{a}" for i, a in zip(ids, anfang)]
+    csv_file.write_text("\n".join(lines) + "\n", encoding="ISO-8859-1")
+
+
+def test_load_and_sort_fahrten_data_multiple_files(tmp_path, monkeypatch):
+    # Ensure the files are parsed by a pool of worker processes
+    pools = []
+
+    class ProcessPoolExecutor(
+        csv_handler.concurrent.futures.ProcessPoolExecutor
+    ):
+        def __init__(self, *args, **kwargs):
+            pools.append(kwargs)
+            super().__init__(*args, **kwargs)
+
+    monkeypatch.setattr(csv_handler.os, "cpu_count", lambda: 2)
+    monkeypatch.setattr(
+        csv_handler.concurrent.futures,
+        "ProcessPoolExecutor",
+        ProcessPoolExecutor,
+    )
+    csv_files = [
+        tmp_path / f"{i}_Fahrten_CarSharing_Erlangen.csv" for i in (3, 1, 2)
+    ]
+    for i, csv_file in zip((3, 1, 2), csv_files):
+        _write_fahrten_csv(
+            csv_file,
+            [2 * i, 2 * i - 1],
+            [f"2023-01-0{i} 12:00:00", f"2023-01-0{i} 10:00:00"],
+        )
+
+    df_list_sorted, csv_files_sorted = csv_handler.load_and_sort_fahrten_data(
+        [str(f) for f in csv_files], cache=False
+    )
+
+    assert [pool["max_workers"] for pool in pools] == [2]
+    assert csv_files_sorted == sorted(str(f) for f in csv_files)
+    assert [df["fahrtneu_id"].tolist() for df in df_list_sorted] == [
+        [1, 2],
+        [3, 4],
+        [5, 6],
+    ]
+    assert df_list_sorted[0]["anfang"].tolist() == [
+        pd.Timestamp("2023-01-01 10:00:00"),
+        pd.Timestamp("2023-01-01 12:00:00"),
+    ]
+
+    # With a single CPU the files are parsed in this process
+    monkeypatch.setattr(csv_handler.os, "cpu_count", lambda: 1)
+    df_list_serial, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(f) for f in csv_files], cache=False
+    )
+    assert len(pools) == 1
+    for df, df_serial in zip(df_list_sorted, df_list_serial):
+        pd.testing.assert_frame_equal(df, df_serial)
+
+
+def test_load_and_sort_fahrten_data_keeps_ties_in_order(tmp_path):
+    csv_file = tmp_path / "Fahrten_CarSharing_Erlangen.csv"
+    ids = list(range(100, 0, -1))
+    _write_fahrten_csv(csv_file, ids, ["2023-01-01 10:00:00"] * len(ids))
+
+    df_list, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(csv_file)], cache=False
+    )
+
+    assert df_list[0]["fahrtneu_id"].tolist() == ids
+
+
+def test_verify_overlapping_bookings_tied_same_order(tmp_path, monkeypatch):
+    # Minute resolution exports: many bookings share the same 'anfang'
+    anfang = [f"2023-01-01 10:{minute:02d}:00" for minute in range(10)]
+    anfang = [a for a in anfang for _ in range(5)]
+    ids = list(range(len(anfang), 0, -1))
+    csv_files = [
+        tmp_path / "1_Fahrten_CarSharing_Erlangen.csv",
+        tmp_path / "2_Fahrten_CarSharing_Erlangen.csv",
+    ]
+    _write_fahrten_csv(csv_files[0], ids[:30], anfang[:30])
+    _write_fahrten_csv(csv_files[1], ids[20:], anfang[20:])
+
+    df_list_sorted, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(f) for f in csv_files], cache=False
+    )
+
+    # Ids of identically ordered exports match without sorting
+    def fail_sort(*args, **kwargs):
+        raise AssertionError("ids should match without sorting")
+
+    monkeypatch.setattr(csv_handler.np, "sort", fail_sort)
+    csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+
+def test_load_and_sort_fahrten_data_missing_id(tmp_path):
+    csv_files = [
+        tmp_path / "1_Fahrten_CarSharing_Erlangen.csv",
+        tmp_path / "2_Fahrten_CarSharing_Erlangen.csv",
+    ]
+    anfang = [f"2023-01-0{day} 10:00:00" for day in range(1, 5)]
+    _write_fahrten_csv(csv_files[0], [1, "", 3], anfang[:3])
+    _write_fahrten_csv(csv_files[1], ["", 3, 4], anfang[1:])
+
+    df_list_sorted, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(f) for f in csv_files], cache=False
+    )
+    assert df_list_sorted[0]["fahrtneu_id"].isna().tolist() == [
+        False,
+        True,
+        False,
+    ]
+
+    # Ensure no AssertionError is raised for the overlap with a missing id
+    csv_handler.verify_overlapping_bookings(df_list_sorted)
+
+    merged_df = csv_handler.merge_nonoverlapping_dfs(df_list_sorted)
+    assert merged_df["fahrtneu_id"].isna().sum() == 1
+    assert merged_df["fahrtneu_id"].dropna().tolist() == [1, 3, 4]
+
+
+def test_load_and_sort_fahrten_data_cache(tmp_path, monkeypatch):
+    csv_file = tmp_path / "Fahrten_CarSharing_Erlangen.csv"
+    csv_file.write_text(
+        "fahrtneu_id;anfang;ende;fahrt_anfang;fahrt_ende\n"
+        "2;2023-01-02 10:00:00;2023-01-02 11:00:00;"
+        "2023-01-02 10:00:00;2023-01-02 11:00:00\n"
+        "1;2023-01-01 10:00:00;2023-01-01 11:00:00;"
+        "2023-01-01 10:00:00;2023-01-01 11:00:00\n",
+        encoding="ISO-8859-1",
+    )
+
+    df_list, _ = csv_handler.load_and_sort_fahrten_data([str(csv_file)])
+    cache_files = glob.glob(str(csv_file) + ".*.feather")
+    assert len(cache_files) == 1
+
+    # A second load is served from the cache
+    df_list_cached, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(csv_file)]
+    )
+    pd.testing.assert_frame_equal(df_list[0], df_list_cached[0])
+    assert df_list_cached[0]["fahrtneu_id"].tolist() == [1, 2]
+
+    # A corrupt cache file, e.g. from an interrupted write, is re-parsed
+    with open(cache_files[0], "wb") as f:
+        f.write(b"corrupt")
+    df_list_reparsed, _ = csv_handler.load_and_sort_fahrten_data(
+        [str(csv_file)]
+    )
+    pd.testing.assert_frame_equal(df_list[0], df_list_reparsed[0])
+    pd.testing.assert_frame_equal(df_list[0], pd.read_feather(cache_files[0]))
+
+    # The cache of a neighbouring file whose name starts with the name of
+    # this file is left alone
+    other_csv_file = tmp_path / (csv_file.name + ".old.csv")
+    other_csv_file.write_bytes(csv_file.read_bytes())
+    csv_handler.load_and_sort_fahrten_data([str(other_csv_file)])
+    other_cache_files = glob.glob(str(other_csv_file) + ".*.feather")
+    assert len(other_cache_files) == 1
+
+    # Changing the CSV file replaces the outdated cache file
+    os.utime(csv_file, ns=(0, 0))
+    csv_handler.load_and_sort_fahrten_data([str(csv_file)])
+    new_cache_files = glob.glob(
+        str(csv_file) + "." + "[0-9a-f]" * 32 + ".feather"
+    )
+    assert len(new_cache_files) == 1
+    assert new_cache_files != cache_files
+    assert glob.glob(str(other_csv_file) + ".*.feather") == other_cache_files
+
+    # A new cache version invalidates the cache
+    monkeypatch.setattr(csv_handler, "_CACHE_VERSION", -1)
+    csv_handler.load_and_sort_fahrten_data([str(csv_file)])
+    assert glob.glob(
+        str(csv_file) + "." + "[0-9a-f]" * 32 + ".feather"
+    ) not in ([], new_cache_files)
+
+
+def test_load_and_sort_fahrten_data_cache_hits_in_process(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(csv_handler.os, "cpu_count", lambda: 2)
+    csv_files = [
+        str(tmp_path / f"{i}_Fahrten_CarSharing_Erlangen.csv") for i in (1, 2)
+    ]
+    for i, csv_file in enumerate(csv_files, 1):
+        _write_fahrten_csv(
+            pathlib.Path(csv_file), [i], [f"2023-01-0{i} 10:00:00"]
+        )
+
+    # The cold load parses both files in worker processes
+    df_list, _ = csv_handler.load_and_sort_fahrten_data(csv_files)
+
+    # The warm load reads the cache without starting a pool
+    def no_pool(*args, **kwargs):
+        raise AssertionError("cache hits should not start a process pool")
+
+    monkeypatch.setattr(
+        csv_handler.concurrent.futures, "ProcessPoolExecutor", no_pool
+    )
+    df_list_cached, _ = csv_handler.load_and_sort_fahrten_data(csv_files)
+    for df, df_cached in zip(df_list, df_list_cached):
+        pd.testing.assert_frame_equal(df, df_cached)
+
+    # A single changed file is parsed in this process as well
+    os.utime(csv_files[1], ns=(0, 0))
+    df_list_reparsed, _ = csv_handler.load_and_sort_fahrten_data(csv_files)
+    for df, df_reparsed in zip(df_list, df_list_reparsed):
+        pd.testing.assert_frame_equal(df, df_reparsed)
+
+
 def test_process_past_bookings():
     root_dir = "../data/"
     csv_files = glob.glob(root_dir + "*Fahrten_CarSharing_Erlangen*.csv")